@@ -1,5 +1,20 @@
-from .repo_structure import get_repo_structure, PROJECT_EXCLUDES
+from .repo_structure import (
+    get_repo_structure,
+    compact_to_dict,
+    stream_repo_structure,
+    get_repo_table,
+    PROJECT_EXCLUDES,
+)
+from .repo_table import RepoTable
 from .clone_progress import CloneProgress
 
 __version__ = "0.1.0"
-__all__ = ['get_repo_structure', 'PROJECT_EXCLUDES', 'CloneProgress']
\ No newline at end of file
+__all__ = [
+    'get_repo_structure',
+    'compact_to_dict',
+    'stream_repo_structure',
+    'get_repo_table',
+    'RepoTable',
+    'PROJECT_EXCLUDES',
+    'CloneProgress',
+]
\ No newline at end of file
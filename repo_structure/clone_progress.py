@@ -1,34 +1,50 @@
 from git import RemoteProgress
 
+def _no_bar():
+    pass
+
 class CloneProgress(RemoteProgress):
     """
     A custom progress handler that integrates GitPython's clone progress
     with the alive-progress library.
     """
-    def __init__(self):
+    def __init__(self, bar=None):
         super().__init__()
-        self._bar = None
+        self.set_bar(bar)
 
     def set_bar(self, bar):
         """
-        Store a reference to an alive_bar so we can update it in `update()`.
+        Store a reference to an alive_bar so we can tick it for each progress line.
         """
         self._bar = bar
+        # Bind the tick function once so the per-line path has no checks
+        self._tick = bar if bar is not None else _no_bar
+
+    def _parse_progress_line(self, line):
+        """
+        Called by GitPython for each line git writes to stderr.
+
+        The base implementation regex-parses every line into op codes and
+        counts just so update() can be called. The bar here is indefinite and
+        only needs a tick per line, so the parsing is skipped. Error lines are
+        still collected in `error_lines` for GitPython's error reporting.
+        """
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", "replace")
+        self._cur_line = line
+
+        if line.startswith(("error:", "fatal:")):
+            self.error_lines.append(line)
+            return
+
+        self._tick()
 
     def update(self, op_code, cur_count, max_count=None, message=''):
         """
-        Called by GitPython for each progress update.
+        Kept for RemoteProgress compatibility; advances the bar by one.
         :param op_code: A numeric code describing the type of operation.
         :param cur_count: The current item count or bytes.
         :param max_count: The maximum item count or bytes (may be None).
         :param message: A progress message from git (may be empty).
         """
-        # If the bar exists, simply increment or set a position.
-        # Because max_count can be None, we typically do an "indefinite" bar.
-        if self._bar:
-            # Indefinite approach: just call bar() to increment by 1 each time
-            self._bar()
-        
-        # Optional: print Git messages if you want more detail
-        if message:
-            print(message)
+        self._tick()
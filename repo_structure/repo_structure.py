@@ -7,13 +7,20 @@ for exclude patterns by project type.
 """
 
 import os
+import re
+import sys
 import json
+import subprocess
+import fnmatch
+import functools
 import git
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from pathspec import PathSpec
 from alive_progress import alive_bar
 
 from .clone_progress import CloneProgress
+from .repo_table import RepoTable, DIRECTORY, FILE
 
 ###################################
 # EXCLUDE PATTERN CONSTANTS
@@ -26,6 +33,9 @@ DEFAULT_EXCLUDES = [
     "venv",            # Python virtual env
 ]
 
+# Merged with the caller's exclude patterns on every get_repo_structure call
+_DEFAULT_EXCLUDES_SET = frozenset(DEFAULT_EXCLUDES)
+
 # Language/Framework-specific ignore patterns
 # (You might expand these lists as needed for your projects)
 PYTHON_EXCLUDES = [
@@ -61,6 +71,35 @@ PROJECT_EXCLUDES = {
     "java": list(set(DEFAULT_EXCLUDES + JAVA_EXCLUDES)),
 }
 
+###################################
+# TRAVERSAL SETTINGS
+###################################
+
+# The top-level subdirectories are walked in a thread pool, but only when
+# there are more than this many of them; for small trees the thread overhead
+# outweighs the gain.
+PARALLEL_DIR_THRESHOLD = 4
+
+# Directory walking is dominated by syscalls that release the GIL, so we can
+# run more threads than there are CPUs.
+PARALLEL_MAX_WORKERS = (os.cpu_count() or 1) * 4
+
+# Entries kept in each of the .gitignore caches (file contents, and
+# compiled pattern sets). A walk reads every .gitignore in the same order,
+# so an LRU smaller than the number of .gitignore files in a repo would
+# never get a hit; this is well above that for real repos, while still
+# bounding what a long-running process keeps after edits and across repos.
+GITIGNORE_CACHE_SIZE = 4096
+
+###################################
+# CLONE SETTINGS
+###################################
+
+# Bytes read from git's stderr per call while cloning. Git rewrites its
+# progress line many times a second, so reading bigger chunks means fewer
+# Python-level calls per tick.
+CLONE_READ_SIZE = 4096
+
 ###################################
 # REPO STRUCTURE LOGIC
 ###################################
@@ -70,7 +109,11 @@ def get_repo_structure(
     clone_path: str = None,
     token: str = None,
     max_depth: int = None,
-    exclude_patterns=None
+    exclude_patterns=None,
+    shallow: bool = True,
+    partial: bool = True,
+    start_subpath: str = None,
+    compact: bool = False
 ):
     """
     Clones a GitHub repo (if not already cloned) and returns its directory structure
@@ -82,37 +125,201 @@ def get_repo_structure(
     :param token: GitHub personal access token (if needed for private repos).
     :param max_depth: Max depth to recursively explore (0 => top-level only). None => no limit.
     :param exclude_patterns: Optional list of folder or file names (globs) to exclude.
+    :param shallow: Clone only the latest commit of the default branch, without tags.
+    :param partial: Clone with --filter=blob:none, so file contents are only fetched
+                    for the checked-out tree.
+    :param start_subpath: Optional path inside the repo (e.g. "packages/api") to return
+                          instead of the whole repo. Only that directory is walked, and
+                          max_depth counts from it. .gitignore rules still apply relative
+                          to the repo root. Raises ValueError if it is not a directory
+                          in the repo, or if it lies in an excluded or ignored directory.
+    :param compact: Return tuple nodes instead of dictionaries: (name, "d", children)
+                    for directories, where children is None if there are none, and
+                    (name, "f", None) for files. They take far less memory than
+                    dictionaries on large repos; compact_to_dict converts them back.
     :return: A nested dictionary representing the directory structure.
     """
-    # If no exclude_patterns were provided, just use DEFAULT_EXCLUDES
-    if exclude_patterns is None:
-        exclude_patterns = DEFAULT_EXCLUDES
-    else:
-        # Combine user-provided excludes with our defaults
-        exclude_patterns = list(set(exclude_patterns + DEFAULT_EXCLUDES))
+    start_path, tree_args = _prepare_traversal(
+        github_url, clone_path, token, max_depth, exclude_patterns, shallow, partial,
+        start_subpath
+    )
 
-    # 1) Clone the repo if needed
-    repo_path = _clone_repo_if_needed(github_url, clone_path, token)
+    # Build the tree starting from repo root (or start_subpath)
+    return _build_tree(
+        current_path=start_path,
+        name=os.path.basename(start_path),
+        current_depth=0,
+        compact=compact,
+        **tree_args
+    )
+
+def compact_to_dict(node):
+    """
+    Converts a tree returned by get_repo_structure(..., compact=True) to the
+    nested dictionary form.
+    """
+    name, type_code, children = node
+    if type_code == "f":
+        return {
+            "name": name,
+            "type": "file"
+        }
 
-    # 2) Parse .gitignore (if present)
-    pathspec_obj = _get_pathspec(repo_path)
+    result = {
+        "name": name,
+        "type": "directory"
+    }
+    if children:
+        result["children"] = [compact_to_dict(child) for child in children]
+    return result
 
-    # 3) Build the tree starting from repo root
-    structure = _build_tree(
-        current_path=repo_path,
-        repo_root=repo_path,
-        pathspec_obj=pathspec_obj,
-        max_depth=max_depth,
+def stream_repo_structure(
+    github_url: str,
+    out,
+    clone_path: str = None,
+    token: str = None,
+    max_depth: int = None,
+    exclude_patterns=None,
+    shallow: bool = True,
+    partial: bool = True,
+    start_subpath: str = None
+):
+    """
+    Same as get_repo_structure, but writes the structure as JSON to `out`
+    while walking the repo instead of returning it. No nested dictionary is
+    built, so memory use grows with the depth of the repo rather than its
+    size. The output is what json.dump would write for get_repo_structure's
+    result.
+
+    :param out: A text file-like object with a write() method.
+    See get_repo_structure for the other parameters.
+    """
+    start_path, tree_args = _prepare_traversal(
+        github_url, clone_path, token, max_depth, exclude_patterns, shallow, partial,
+        start_subpath
+    )
+
+    _stream_tree(
+        out,
+        current_path=start_path,
+        name=os.path.basename(start_path),
         current_depth=0,
-        exclude_patterns=exclude_patterns
+        **tree_args
     )
 
-    return structure
+def get_repo_table(
+    github_url: str,
+    clone_path: str = None,
+    token: str = None,
+    max_depth: int = None,
+    exclude_patterns=None,
+    shallow: bool = True,
+    partial: bool = True,
+    start_subpath: str = None
+):
+    """
+    Same as get_repo_structure, but returns the structure as a RepoTable:
+    parallel arrays of names, type codes and parent indices instead of one
+    dictionary per node. Use RepoTable.rows() to iterate it as a flat table,
+    or RepoTable.to_dict() to get the nested form.
 
-def clone_repo_with_progress(github_url, clone_path, token=None):
+    See get_repo_structure for the parameters.
+    """
+    start_path, tree_args = _prepare_traversal(
+        github_url, clone_path, token, max_depth, exclude_patterns, shallow, partial,
+        start_subpath
+    )
+
+    table = RepoTable()
+    _fill_table(
+        table,
+        current_path=start_path,
+        name=os.path.basename(start_path),
+        current_depth=0,
+        **tree_args
+    )
+    return table
+
+def _prepare_traversal(
+    github_url, clone_path, token, max_depth, exclude_patterns, shallow, partial,
+    start_subpath=None
+):
+    """
+    Clones the repo if needed and compiles the exclude and .gitignore patterns.
+    Returns the directory to start walking from (the repo root, or
+    `start_subpath` inside it) as a string, plus the keyword arguments shared
+    by _build_tree, _stream_tree and _fill_table.
+    """
+    # Combine user-provided excludes (if any) with our defaults
+    exclude_set = _DEFAULT_EXCLUDES_SET | frozenset(exclude_patterns or ())
+    exclude_names, exclude_regex = _compile_excludes(exclude_set)
+
+    # 1) Clone the repo if needed
+    repo_path = _clone_repo_if_needed(
+        github_url, clone_path, token, shallow=shallow, partial=partial
+    )
+
+    # Relative paths are taken by slicing off root_prefix instead of
+    # calling relative_to per entry. The root is normalized so that
+    # start_subpath (normalized below) can be checked against it.
+    repo_root_str = os.path.abspath(repo_path)
+    root_prefix = repo_root_str + os.sep
+    if not os.path.isfile(os.path.join(repo_root_str, ".gitignore")):
+        print(f"Warning: No .gitignore found at the root of {repo_path}")
+
+    # Anchor the walk at start_subpath so sibling directories are never opened
+    start_path = repo_root_str
+    if start_subpath:
+        start_path = os.path.normpath(os.path.join(repo_root_str, start_subpath))
+        if start_path != repo_root_str and not start_path.startswith(root_prefix):
+            raise ValueError(f"start_subpath must point inside the repo: {start_subpath}")
+        if not os.path.isdir(start_path):
+            raise ValueError(f"start_subpath is not a directory in the repo: {start_subpath}")
+
+    # 2) Parse the .gitignore files above the start directory. Those in the
+    # start directory and below are read as the walk lists them. Every
+    # directory on the way has to be one a full walk would list, so that no
+    # subtree is returned that the full tree leaves out.
+    ignore_spec = _NO_IGNORE_SPEC
+    rel_start = start_path[len(root_prefix):]
+    current_path = repo_root_str
+    rel_dir = ""
+    for part in rel_start.split(os.sep) if rel_start else ():
+        gitignore_path = os.path.join(current_path, ".gitignore")
+        if os.path.isfile(gitignore_path):
+            ignore_spec = _add_gitignore(ignore_spec, gitignore_path, rel_dir)
+        current_path = os.path.join(current_path, part)
+        if not _is_walked_dir(
+            current_path, rel_dir, part, ignore_spec, exclude_names, exclude_regex
+        ):
+            raise ValueError(f"start_subpath is excluded or ignored in the repo: {start_subpath}")
+        rel_dir = f"{rel_dir}/{part}" if rel_dir else part
+
+    tree_args = {
+        "root_prefix": root_prefix,
+        "ignore_spec": ignore_spec,
+        "max_depth": max_depth,
+        "exclude_names": exclude_names,
+        "exclude_regex": exclude_regex,
+    }
+
+    return start_path, tree_args
+
+def clone_repo_with_progress(github_url, clone_path, token=None, shallow=True, partial=True):
     """
     Clones a GitHub repo to the specified path with an alive-progress spinner.
     If a token is provided for a private repo, we'll insert it into the URL.
+
+    Only the checked-out tree is traversed, so by default the clone skips
+    history and tags (shallow=True) and unneeded blobs (partial=True). Pass
+    False for either to get a full clone.
+
+    The spinner (and git's --progress output, which has to be parsed line by
+    line) is only used when stderr is a terminal. Git is never allowed to
+    prompt for credentials; a failed authentication raises instead of hanging.
+
+    git is run directly (see _run_git_clone) rather than through
+    git.Repo.clone_from. Raises git.GitCommandError if the clone fails.
     """
     # If token is provided, modify the URL to include it (assuming https://).
     if token:
@@ -124,17 +331,73 @@ def clone_repo_with_progress(github_url, clone_path, token=None):
     else:
         authed_url = github_url
 
-    progress_handler = CloneProgress()
+    multi_options = []
+    if shallow:
+        multi_options.extend(["--depth=1", "--single-branch", "--no-tags"])
+    if partial:
+        multi_options.append("--filter=blob:none")
+
+    clone_args = multi_options + ["--", authed_url, str(clone_path)]
+    # Shown in errors instead of the real command, which may contain the token
+    safe_args = multi_options + ["--", github_url, str(clone_path)]
+
+    # Nobody is watching a non-interactive run, so skip the progress handling.
+    # sys.stderr is None under pythonw or when the stream is closed.
+    if sys.stderr is None or not sys.stderr.isatty():
+        _run_git_clone(clone_args, safe_args, CloneProgress())
+        return git.Repo(clone_path)
 
     # We wrap the clone operation in a `with alive_bar(...) as bar:` context
     # so that the bar is properly closed when done (or if an error occurs).
     with alive_bar(title=f"Cloning {github_url}", spinner="dots") as bar:
-        progress_handler.set_bar(bar)
-        repo = git.Repo.clone_from(authed_url, clone_path, progress=progress_handler)
-    
-    return repo
+        _run_git_clone(["--progress"] + clone_args, safe_args, CloneProgress(bar))
+
+    return git.Repo(clone_path)
 
-def _clone_repo_if_needed(github_url, clone_path, token):
+def _run_git_clone(clone_args, safe_args, progress_handler):
+    """
+    Runs `git clone <clone_args>` and feeds each line git writes to stderr
+    to `progress_handler` (a CloneProgress). Progress lines are terminated by
+    "\r" rather than "\n", so both are treated as line ends. Raises
+    git.GitCommandError with the collected error lines if git fails;
+    `safe_args` is what the error shows as the command.
+    """
+    env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+    handle_line = progress_handler.new_message_handler()
+
+    proc = subprocess.Popen(
+        ["git", "clone"] + clone_args,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    pending = b""
+    try:
+        with proc.stderr:
+            # read1 returns whatever is available, so the bar ticks as git writes
+            for chunk in iter(lambda: proc.stderr.read1(CLONE_READ_SIZE), b""):
+                lines = re.split(rb"[\r\n]", pending + chunk)
+                pending = lines.pop()
+                for line in lines:
+                    if line:
+                        handle_line(line.decode("utf-8", "replace"))
+        if pending:
+            handle_line(pending.decode("utf-8", "replace"))
+    except BaseException:
+        # e.g. KeyboardInterrupt or a failing progress handler: don't leave
+        # git running (or a zombie) behind
+        proc.kill()
+        proc.wait()
+        raise
+
+    status = proc.wait()
+    if status != 0:
+        raise git.GitCommandError(
+            ["git", "clone"] + safe_args, status, "\n".join(progress_handler.error_lines)
+        )
+
+def _clone_repo_if_needed(github_url, clone_path, token, shallow=True, partial=True):
     """
     Uses clone_repo_with_progress(...) if the path is not already cloned.
     """
@@ -146,144 +409,559 @@ def _clone_repo_if_needed(github_url, clone_path, token):
         return repo_path
     else:
         print(f"Cloning repository from {github_url} into {repo_path}")
-        clone_repo_with_progress(github_url, repo_path, token=token)
+        clone_repo_with_progress(
+            github_url, repo_path, token=token, shallow=shallow, partial=partial
+        )
         return repo_path
 
-def _get_pathspec(repo_path):
-    """
-    Reads .gitignore (if present) from the root of `repo_path` and returns a
-    compiled pathspec object. If no .gitignore is found, returns None.
-    """
-    gitignore_patterns = []
-    root_gitignore = repo_path / ".gitignore"
-    if root_gitignore.is_file():
-        with root_gitignore.open("r") as f:
-            gitignore_patterns.extend(f.readlines())
-            
-    for path in repo_path.rglob(".gitignore"):
-        if path != root_gitignore:
-            with path.open("r") as f:
-                relative_path = path.parent.relative_to(repo_path)
-                patterns = f.readlines()
-                for pattern in patterns:
-                    pattern = pattern.strip()
-                    if pattern and not pattern.startswith('#'):
-                        if not pattern.startswith('/'):
-                            gitignore_patterns.append(f"/{relative_path}/{pattern}\n")
-                        else:
-                            gitignore_patterns.append(f"/{relative_path}{pattern}\n")
-
-    if not gitignore_patterns:
-        return None
+# The ignore state of a directory: (pattern lines, match function, shared
+# prefix) as returned by _compile_gitignore. This one means "no patterns".
+_NO_IGNORE_SPEC = ((), None, "")
 
+def _add_gitignore(ignore_spec, gitignore_path, rel_dir):
+    """
+    Returns `ignore_spec` extended with the patterns of the .gitignore file at
+    `gitignore_path`. `rel_dir` is the "/"-separated path of its directory
+    relative to the repo root ("" for the root itself). Patterns of deeper
+    files come later, so they take precedence over those of the files above.
+
+    Reading and compiling are cached, so calling get_repo_structure again on
+    the same clone only costs a stat per .gitignore the walk reaches; the
+    listing itself is still done on every call.
+    """
+    stat = os.stat(gitignore_path)
+    patterns = _read_gitignore(gitignore_path, rel_dir or None, stat.st_mtime_ns, stat.st_size)
+    if not patterns:
+        return ignore_spec
+    return _compile_gitignore(ignore_spec[0] + patterns)
+
+@functools.lru_cache(maxsize=GITIGNORE_CACHE_SIZE)
+def _read_gitignore(path, relative_path, mtime_ns, size):
+    """
+    Returns the pattern lines of the .gitignore file at `path` as a tuple.
+    For a nested .gitignore, `relative_path` is its directory relative to the
+    repo root and the patterns are rewritten relative to the repo root, as
+    git reads them: a pattern with a "/" before its last character matches
+    from that directory, any other pattern at any depth below it, and a
+    leading "!" stays in front. For the root .gitignore `relative_path` is
+    None and the lines are returned as they are.
+    `mtime_ns` and `size` are not used here; they are part of the cache key,
+    so an edited file is read again.
+    """
+    with open(path, "r") as f:
+        lines = f.readlines()
+
+    if relative_path is None:
+        return tuple(lines)
+
+    patterns = []
+    for pattern in lines:
+        pattern = pattern.strip()
+        if pattern and not pattern.startswith('#'):
+            negation = ""
+            if pattern.startswith('!'):
+                negation = "!"
+                pattern = pattern[1:]
+            if '/' in pattern[:-1]:
+                patterns.append(f"{negation}/{relative_path}/{pattern.lstrip('/')}\n")
+            else:
+                patterns.append(f"{negation}/{relative_path}/**/{pattern}\n")
+    return tuple(patterns)
+
+@functools.lru_cache(maxsize=GITIGNORE_CACHE_SIZE)
+def _compile_gitignore(gitignore_patterns):
+    """
+    Compiles a tuple of .gitignore lines into an ignore spec:
+    (the lines, match function, shared prefix).
+    """
     # Use Git's wildcard matching
-    return PathSpec.from_lines("gitwildmatch", gitignore_patterns)
+    pathspec_obj = PathSpec.from_lines("gitwildmatch", gitignore_patterns)
+    return (
+        gitignore_patterns,
+        _compile_ignore_matcher(pathspec_obj, gitignore_patterns),
+        _common_pattern_prefix(gitignore_patterns)
+    )
 
-def _is_ignored(path, pathspec_obj, repo_root):
+def _compile_ignore_matcher(pathspec_obj, gitignore_patterns):
+    """
+    Returns a function that takes an iterable of relative, "/"-separated paths
+    and returns the set of those that `pathspec_obj` ignores. It is called
+    once per directory with all of its entries.
+
+    PathSpec.match_file tries every pattern's regex in turn. When there are no
+    negated patterns, a path is ignored as soon as any pattern matches, so all
+    of them can be joined into one alternation and matched in a single call.
+    """
+    patterns = [p for p in pathspec_obj.patterns if p.include is not None]
+    if not patterns:
+        return lambda rel_paths: set()
+
+    # With negations the last matching pattern wins, which a single
+    # alternation cannot express, so keep PathSpec's own matching. Its
+    # match_files amortizes the per-call overhead over the whole batch.
+    if not all(p.include for p in patterns):
+        negated_prefixes = _negated_pattern_prefixes(gitignore_patterns)
+        return lambda rel_paths: _match_files_with_negations(
+            pathspec_obj, negated_prefixes, rel_paths
+        )
+
+    # pathspec reuses the same group names in every pattern, which would clash
+    # once joined together
+    regex = re.compile("|".join(
+        "(?:%s)" % re.sub(r"\(\?P<\w+>", "(?:", p.regex.pattern)
+        for p in patterns
+    ))
+    match = regex.match
+    return lambda rel_paths: {p for p in rel_paths if match(p)}
+
+def _match_files_with_negations(pathspec_obj, negated_prefixes, rel_paths):
+    """
+    Returns the set of `rel_paths` that `pathspec_obj` ignores, when it has
+    negated patterns.
+
+    Directories are matched with their trailing "/", as in _get_ignored, so
+    "build/" still prunes the build directory. The exception is a directory
+    that one of `negated_prefixes` (see _negated_pattern_prefixes) lies
+    under: a pattern like "keep/**" matches the directory "keep/" itself,
+    and pruning it would drop files that a later "!keep/k.txt" re-includes,
+    so it is walked instead and its entries are matched one by one.
+    """
+    return {
+        p for p in pathspec_obj.match_files(rel_paths)
+        if not (p.endswith("/") and any(n.startswith(p) for n in negated_prefixes))
+    }
+
+def _negated_pattern_prefixes(patterns):
+    """
+    Returns the literal part (up to the first wildcard, without the leading
+    "/") of every anchored negated pattern in `patterns`, as a tuple. These
+    are the only negations that can re-include a path below a directory the
+    other patterns ignore; git never looks inside an ignored directory for
+    unanchored ones such as "!.gitkeep".
+    """
+    prefixes = []
+    for line in patterns:
+        pattern = line.strip()
+        if not pattern.startswith('!'):
+            continue
+        pattern = pattern[1:]
+        # Only a "/" before the last character anchors a pattern
+        if '/' not in pattern[:-1]:
+            continue
+        prefixes.append(re.split(r'[*?\[\\]', pattern.lstrip('/'), maxsplit=1)[0])
+    return tuple(prefixes)
+
+def _common_pattern_prefix(patterns):
     """
-    Returns True if the file/folder at `path` is ignored according to .gitignore.
-    If pathspec_obj is None, we return False. Compares the relative path.
+    Returns the literal directory prefix (e.g. "src/") that every pattern is
+    anchored under, or "" if there is none. Paths outside this prefix cannot
+    match any pattern, so matching can be skipped for them entirely.
+    Negated patterns are left out since they can only un-ignore a path.
     """
-    if pathspec_obj is None:
-        print(f"Warning: No .gitignore patterns found for {path}")
+    prefix = None
+    for line in patterns:
+        pattern = line.strip()
+        if not pattern or pattern.startswith('#') or pattern.startswith('!'):
+            continue
+        # Unanchored patterns can match at any depth
+        if not pattern.startswith('/'):
+            return ""
+        # Keep the part before the first wildcard, cut back to a full directory
+        literal = re.split(r'[*?\[\\]', pattern[1:], maxsplit=1)[0]
+        literal = literal[:literal.rfind('/') + 1]
+        if prefix is None:
+            prefix = literal
+        else:
+            prefix = os.path.commonprefix([prefix, literal])
+            prefix = prefix[:prefix.rfind('/') + 1]
+        if not prefix:
+            return ""
+
+    return prefix or ""
+
+def _get_ignored(rel_dir, candidates, ignore_matcher, ignore_prefix=""):
+    """
+    Returns the set of names among `candidates` ((name, is_dir) pairs listed
+    from the directory whose "/"-separated relative path is `rel_dir`) that
+    .gitignore excludes. All of a directory's entries are matched in one
+    ignore_matcher call.
+
+    Directories are matched with a trailing "/" so that directory-only patterns
+    such as "build/" ignore the directory itself. The caller then never
+    descends into it, so its files are not matched one by one.
+    """
+    if rel_dir:
+        rel_dir += "/"
+
+    rel_names = {}
+    for name, is_dir in candidates:
+        rel_str = rel_dir + name + "/" if is_dir else rel_dir + name
+        # No pattern can match outside the shared pattern prefix
+        if ignore_prefix and not rel_str.startswith(ignore_prefix):
+            continue
+        rel_names[rel_str] = name
+
+    if not rel_names:
+        return set()
+    return {rel_names[p] for p in ignore_matcher(rel_names)}
+
+def _is_walked_dir(path, rel_dir, name, ignore_spec, exclude_names, exclude_regex):
+    """
+    Returns whether a full walk would list the directory `name` at `path`,
+    whose parent's "/"-separated relative path is `rel_dir`: it is not a
+    symlink, not excluded and not ignored by `ignore_spec`. This is the check
+    _list_dir applies to each of its entries.
+    """
+    if name in exclude_names or (exclude_regex is not None and exclude_regex.match(name)):
         return False
+    if os.path.islink(path):
+        return False
+    _, ignore_matcher, ignore_prefix = ignore_spec
+    if ignore_matcher is None:
+        return True
+    return not _get_ignored(rel_dir, [(name, True)], ignore_matcher, ignore_prefix)
 
-    rel_str = str(path.relative_to(repo_root))
-    is_ignored = pathspec_obj.match_file(rel_str)
-    # print(f"Checking path: {rel_str}, Ignored: {is_ignored}")
-    return is_ignored
+def _compile_excludes(exclude_set):
+    """
+    Splits exclude_set (a frozenset of patterns) into a frozenset of literal
+    names and a single compiled regex for the glob patterns (None if there are
+    no globs), so each entry name can be checked with one set lookup and at
+    most one regex match.
+    """
+    globs = sorted(p for p in exclude_set if any(c in p for c in "*?["))
+    names = exclude_set.difference(globs)
+    if not globs:
+        return names, None
+    return names, re.compile("|".join(fnmatch.translate(g) for g in globs))
+
+def _list_dir(
+    current_path: str,
+    root_prefix: str,
+    ignore_spec,
+    exclude_names,
+    exclude_regex
+):
+    """
+    Lists the entries of the directory at `current_path` that belong in the tree.
+    - Entries that match .gitignore or the exclude list are skipped.
+    - Symlinks and special files are skipped.
+
+    Entries are listed with os.scandir, whose DirEntry objects carry the file
+    type from the directory listing, so classifying an entry needs no extra
+    stat call.
+
+    `ignore_spec` holds the .gitignore patterns of the directories above.
+    If this directory has its own .gitignore, it is read here and applied to
+    this directory's entries, so .gitignore files are only ever found in
+    directories the walk actually lists.
+
+    Returns (entries, dir_count, ignore_spec). `entries` is a sorted list of
+    (is_file, lowercase name, name, DirEntry) tuples: directories first, each
+    group ordered by name (case-insensitive). The first `dir_count` entries
+    are the directories. The returned ignore_spec is the one to list them with.
+    """
+    candidates = []
+    gitignore_path = None
+    # This loop runs once per entry in the repo, so the per-entry checks
+    # are inlined and lookups are bound to locals up front.
+    append = candidates.append
+    exclude_match = exclude_regex.match if exclude_regex is not None else None
+    with os.scandir(current_path) as it:
+        for entry in it:
+            name = entry.name
+            # Its patterns apply even if the file itself is excluded
+            if name == ".gitignore" and entry.is_file(follow_symlinks=False):
+                gitignore_path = entry.path
+            # Check the exclude list first; it only needs the name
+            if name in exclude_names:
+                continue
+            if exclude_match is not None and exclude_match(name):
+                continue
+            # Ignore symlinks
+            if entry.is_symlink():
+                continue
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if not is_dir and not entry.is_file(follow_symlinks=False):
+                # Anything else (e.g., device files) is skipped
+                continue
+            append((name, is_dir, entry))
+
+    # The repo root's own relative path is ""
+    rel_dir = current_path[len(root_prefix):]
+    # Patterns are written with "/" regardless of platform
+    if os.sep != "/":
+        rel_dir = rel_dir.replace(os.sep, "/")
+
+    if gitignore_path is not None:
+        ignore_spec = _add_gitignore(ignore_spec, gitignore_path, rel_dir)
+
+    # Check which entries .gitignore excludes, all in one batch
+    ignored = ()
+    _, ignore_matcher, ignore_prefix = ignore_spec
+    if ignore_matcher is not None and candidates:
+        ignored = _get_ignored(
+            rel_dir,
+            [(name, is_dir) for name, is_dir, _ in candidates],
+            ignore_matcher,
+            ignore_prefix
+        )
+
+    # The exact name breaks case-insensitive ties, so DirEntry objects are
+    # never compared when sorting.
+    entries = []
+    dir_count = 0
+    for name, is_dir, entry in candidates:
+        if name in ignored:
+            continue
+        entries.append((not is_dir, name.lower(), name, entry))
+        dir_count += is_dir
+
+    entries.sort()
+    return entries, dir_count, ignore_spec
+
+# Events yielded by _walk_tree
+_ENTER_DIR = 0
+_FILES = 1
+_LEAVE_DIR = 2
+
+def _walk_tree(
+    current_path: str,
+    name: str,
+    root_prefix: str,
+    ignore_spec,
+    max_depth: int,
+    current_depth: int,
+    exclude_names,
+    exclude_regex,
+    listing=None
+):
+    """
+    Walks the directory at `current_path` depth-first and yields its
+    structure as (event, value) pairs:
+    - (_ENTER_DIR, name) when a directory starts,
+    - (_FILES, names) with the sorted names of its files, after all of its
+      subdirectories have been left (omitted if it has no files),
+    - (_LEAVE_DIR, None) when it ends.
+    Directories come first, in the order _list_dir sorts them.
+
+    This is the one walk shared by _build_tree, _stream_tree and _fill_table.
+    It is iterative: directories still to be listed are kept on an explicit
+    stack, so there is no Python call per directory and no limit on how deep
+    the repo can be. `listing` may be the _list_dir result for `current_path`
+    if the caller has already listed it.
+    """
+    stack = [(_ENTER_DIR, (current_path, name, current_depth, ignore_spec))]
+
+    while stack:
+        event, value = stack.pop()
+        if event != _ENTER_DIR:
+            yield event, value
+            continue
+
+        path, dir_name, depth, dir_ignore_spec = value
+        yield _ENTER_DIR, dir_name
+        stack.append((_LEAVE_DIR, None))
+
+        # If max_depth=0, return only current level (no children).
+        # If max_depth=1, return current + one level below, etc.
+        # At exactly max_depth, skip listing the directory at all.
+        if max_depth is not None and depth >= max_depth:
+            continue
+
+        if listing is not None:
+            entries, dir_count, child_ignore_spec = listing
+            listing = None
+        else:
+            entries, dir_count, child_ignore_spec = _list_dir(
+                path,
+                root_prefix,
+                dir_ignore_spec,
+                exclude_names,
+                exclude_regex
+            )
+
+        # Pushed in reverse, so the subdirectories are walked in sorted
+        # order and the files come out after them.
+        if dir_count < len(entries):
+            stack.append((_FILES, [f[2] for f in entries[dir_count:]]))
+        for i in range(dir_count - 1, -1, -1):
+            d = entries[i]
+            stack.append((_ENTER_DIR, (d[3].path, d[2], depth + 1, child_ignore_spec)))
 
 def _build_tree(
-    current_path: Path,
-    repo_root: Path,
-    pathspec_obj: PathSpec,
+    current_path: str,
+    name: str,
+    root_prefix: str,
+    ignore_spec,
     max_depth: int,
     current_depth: int,
-    exclude_patterns
+    exclude_names,
+    exclude_regex,
+    compact: bool = False
 ):
     """
-    Recursively builds a JSON-like tree representing the repo structure.
+    Builds a JSON-like tree representing the repo structure.
     - Directories and files that match .gitignore or the exclude list are skipped.
     - Symlinks are ignored.
     - Returns directories first (alphabetically) then files (alphabetically).
     - If type="file", omits "children". If a directory has no children, omits "children".
-    """
-
-    # If max_depth=0, return only current level (no children).
-    # If max_depth=1, return current + one level below, etc.
-    if max_depth is not None and current_depth > max_depth:
-        return None
-
-    # Check if any part of the path is in exclude_patterns
-    if any(part in exclude_patterns for part in current_path.parts):
-        return None
-
-    # Check if .gitignore excludes this path
-    if _is_ignored(current_path, pathspec_obj, repo_root):
-        return None
 
-    # Ignore symlinks
-    if current_path.is_symlink():
-        return None
-
-    # If this is a file
-    if current_path.is_file():
-        return {
-            "name": current_path.name,
-            "type": "file"
-        }
+    The tree is assembled from _walk_tree's events. A directory's node is
+    created when it is left, by which point its subtree is complete.
 
-    # If this is a directory
-    if current_path.is_dir():
-        node = {
-            "name": current_path.name,
-            "type": "directory"
-        }
-
-        # If we're at exactly max_depth, don't gather children.
-        # Only gather if current_depth < max_depth (or if max_depth is None).
-        if max_depth is None or current_depth < max_depth:
-            dirs = []
-            files = []
-            for entry in current_path.iterdir():
-                if entry.is_dir():
-                    dirs.append(entry)
-                else:
-                    files.append(entry)
-
-            # Sort directories and files by name (case-insensitive)
-            dirs.sort(key=lambda d: d.name.lower())
-            files.sort(key=lambda f: f.name.lower())
-
-            children = []
-            for d in dirs:
-                child_node = _build_tree(
-                    d,
-                    repo_root,
-                    pathspec_obj,
-                    max_depth,
-                    current_depth + 1,
-                    exclude_patterns
-                )
-                if child_node is not None:
-                    children.append(child_node)
-
-            for f in files:
-                child_node = _build_tree(
-                    f,
-                    repo_root,
-                    pathspec_obj,
+    With compact=True, nodes are tuples instead of dictionaries (see
+    get_repo_structure).
+    """
+    walk_args = (root_prefix, ignore_spec, max_depth, current_depth, exclude_names, exclude_regex)
+    listing = None
+
+    # Subtrees are independent, so the top-level directories can be walked
+    # concurrently. Each worker builds one subtree, and executor.map keeps
+    # the results in the sorted order.
+    if current_depth == 0 and (max_depth is None or current_depth < max_depth):
+        listing = _list_dir(current_path, root_prefix, ignore_spec, exclude_names, exclude_regex)
+        entries, dir_count, child_ignore_spec = listing
+        if dir_count > PARALLEL_DIR_THRESHOLD:
+            def build_child(d):
+                return _build_tree(
+                    d[3].path,
+                    d[2],
+                    root_prefix,
+                    child_ignore_spec,
                     max_depth,
                     current_depth + 1,
-                    exclude_patterns
+                    exclude_names,
+                    exclude_regex,
+                    compact
                 )
-                if child_node is not None:
-                    children.append(child_node)
-
-            if children:
-                node["children"] = children
 
-        return node
+            workers = min(dir_count, PARALLEL_MAX_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                children = list(executor.map(build_child, entries[:dir_count]))
+            children.extend(_file_nodes([f[2] for f in entries[dir_count:]], compact))
+            return _dir_node(name, children, compact)
+
+    # The children of every directory currently open; the outermost list
+    # receives the finished root node.
+    open_children = [[]]
+    open_names = []
+    for event, value in _walk_tree(current_path, name, *walk_args, listing=listing):
+        if event == _ENTER_DIR:
+            open_names.append(value)
+            open_children.append([])
+        elif event == _FILES:
+            open_children[-1].extend(_file_nodes(value, compact))
+        else:
+            children = open_children.pop()
+            open_children[-1].append(_dir_node(open_names.pop(), children, compact))
+
+    return open_children[0][0]
+
+def _file_nodes(names, compact):
+    """
+    Returns the file nodes for `names`, for _build_tree.
+    """
+    if compact:
+        return [(name, "f", None) for name in names]
+    return [{"name": name, "type": "file"} for name in names]
 
-    # Special case: neither file nor directory (e.g., device file on unusual OS)
-    return None
+def _dir_node(name, children, compact):
+    """
+    Returns a directory node for _build_tree.
+    """
+    if compact:
+        return (name, "d", children or None)
+
+    node = {
+        "name": name,
+        "type": "directory"
+    }
+    if children:
+        node["children"] = children
+    return node
+
+def _stream_tree(
+    out,
+    current_path: str,
+    name: str,
+    root_prefix: str,
+    ignore_spec,
+    max_depth: int,
+    current_depth: int,
+    exclude_names,
+    exclude_regex
+):
+    """
+    Writes the directory at `current_path` to `out` as JSON, in the same
+    shape and order _build_tree returns, as _walk_tree yields it. Only the
+    directories still to be walked are held in memory. The walk is
+    sequential, since output has to be written in order.
+    """
+    write = out.write
+    # For every directory currently open, whether its "children" list has
+    # been started
+    started = []
+    for event, value in _walk_tree(
+        current_path,
+        name,
+        root_prefix,
+        ignore_spec,
+        max_depth,
+        current_depth,
+        exclude_names,
+        exclude_regex
+    ):
+        if event == _LEAVE_DIR:
+            write(']}' if started.pop() else '}')
+            continue
+
+        if started:
+            if started[-1]:
+                write(', ')
+            else:
+                write(', "children": [')
+                started[-1] = True
+
+        if event == _ENTER_DIR:
+            write('{"name": %s, "type": "directory"' % json.dumps(value))
+            started.append(False)
+        else:
+            write(', '.join('{"name": %s, "type": "file"}' % json.dumps(n) for n in value))
+
+def _fill_table(
+    table: RepoTable,
+    current_path: str,
+    name: str,
+    root_prefix: str,
+    ignore_spec,
+    max_depth: int,
+    current_depth: int,
+    exclude_names,
+    exclude_regex
+):
+    """
+    Appends the directory at `current_path` and everything under it to
+    `table`, in the same order _build_tree returns them, as _walk_tree
+    yields them.
+    """
+    add = table.add
+    # Table indices of the directories currently open
+    parents = [-1]
+    for event, value in _walk_tree(
+        current_path,
+        name,
+        root_prefix,
+        ignore_spec,
+        max_depth,
+        current_depth,
+        exclude_names,
+        exclude_regex
+    ):
+        if event == _ENTER_DIR:
+            parents.append(add(value, DIRECTORY, parents[-1]))
+        elif event == _FILES:
+            parent = parents[-1]
+            for file_name in value:
+                add(file_name, FILE, parent)
+        else:
+            parents.pop()
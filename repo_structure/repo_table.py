@@ -0,0 +1,70 @@
+from array import array
+
+# Type codes stored in RepoTable.types
+DIRECTORY = ord("d")
+FILE = ord("f")
+
+_TYPE_NAMES = {DIRECTORY: "directory", FILE: "file"}
+
+class RepoTable:
+    """
+    A columnar (struct-of-arrays) form of the repo structure.
+
+    Node `i` has a name `names[i]`, a type code `types[i]` (DIRECTORY or FILE)
+    and the index of its parent `parents[i]` (-1 for the root). Nodes are
+    stored in depth-first order, directories before files, so a parent always
+    comes before its children. This takes far less memory than one dict per
+    node for large repos.
+    """
+    def __init__(self):
+        self.names = []
+        self.types = bytearray()
+        self.parents = array("i")
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, type_code, parent):
+        """
+        Appends a node and returns its index.
+        """
+        self.names.append(name)
+        self.types.append(type_code)
+        self.parents.append(parent)
+        return len(self.names) - 1
+
+    def rows(self):
+        """
+        Yields a (path, type) pair for every node below the root, in table
+        order. Paths are relative to the repo root and "/"-separated; type is
+        "directory" or "file".
+        """
+        dir_paths = {0: ""}
+        names = self.names
+        types = self.types
+        parents = self.parents
+        for i in range(1, len(names)):
+            parent_path = dir_paths[parents[i]]
+            path = f"{parent_path}/{names[i]}" if parent_path else names[i]
+            if types[i] == DIRECTORY:
+                dir_paths[i] = path
+            yield path, _TYPE_NAMES[types[i]]
+
+    def to_dict(self):
+        """
+        Returns the nested dictionary form, as returned by get_repo_structure.
+        """
+        if not self.names:
+            return None
+
+        nodes = []
+        for name, type_code, parent in zip(self.names, self.types, self.parents):
+            node = {
+                "name": name,
+                "type": _TYPE_NAMES[type_code]
+            }
+            nodes.append(node)
+            if parent >= 0:
+                nodes[parent].setdefault("children", []).append(node)
+
+        return nodes[0]
@@ -0,0 +1,208 @@
+import io
+import json
+import os
+import subprocess
+
+import git
+import pytest
+
+from repo_structure import (
+    compact_to_dict,
+    get_repo_structure,
+    get_repo_table,
+    stream_repo_structure,
+)
+from repo_structure import repo_structure
+from repo_structure.repo_structure import PARALLEL_DIR_THRESHOLD, clone_repo_with_progress
+
+def _make_repo(root, files, gitignore=None):
+    """
+    Creates a fake clone at `root` (a .git folder makes get_repo_structure
+    skip cloning) with the given files, plus an optional root .gitignore.
+    """
+    (root / ".git").mkdir(parents=True)
+    for rel in files:
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    if gitignore is not None:
+        (root / ".gitignore").write_text(gitignore)
+    return root
+
+def _paths(node, prefix=""):
+    """
+    Flattens a get_repo_structure tree to a set of relative paths.
+    """
+    paths = set()
+    for child in node.get("children", []):
+        path = prefix + child["name"]
+        paths.add(path)
+        paths |= _paths(child, path + "/")
+    return paths
+
+def test_negated_file_under_ignored_directory_glob(tmp_path):
+    repo = _make_repo(
+        tmp_path / "repo",
+        ["keep/k.txt", "keep/other.txt", "main.py"],
+        gitignore="keep/**\n!keep/k.txt\n",
+    )
+
+    paths = _paths(get_repo_structure("unused", str(repo)))
+
+    assert "keep/k.txt" in paths
+    assert "keep/other.txt" not in paths
+    assert "main.py" in paths
+
+def test_unrelated_negation_still_prunes_ignored_directory(tmp_path):
+    repo = _make_repo(
+        tmp_path / "repo",
+        ["build/out/y.txt", "a.py"],
+        gitignore="build/\n!x\n",
+    )
+
+    paths = _paths(get_repo_structure("unused", str(repo)))
+
+    assert paths == {".gitignore", "a.py"}
+
+def test_nested_gitignore_applies_to_its_subtree(tmp_path):
+    repo = _make_repo(
+        tmp_path / "repo",
+        ["lib/a.tmp", "lib/sub/b.tmp", "lib/keep.tmp", "lib/only/x.txt",
+         "lib/sub/only/y.txt", "c.tmp", "lib/keep.txt"],
+    )
+    (repo / "lib" / ".gitignore").write_text("*.tmp\n!keep.tmp\n/only/\n")
+
+    paths = _paths(get_repo_structure("unused", str(repo)))
+
+    assert "lib/a.tmp" not in paths
+    assert "lib/sub/b.tmp" not in paths
+    assert "lib/keep.tmp" in paths
+    assert "lib/keep.txt" in paths
+    assert "lib/only" not in paths
+    assert "lib/sub/only/y.txt" in paths
+    assert "c.tmp" in paths
+
+def test_gitignore_in_excluded_directory_is_not_read(tmp_path, monkeypatch):
+    repo = _make_repo(tmp_path / "repo", ["node_modules/pkg/x.js", "main.py"])
+    (repo / "node_modules" / ".gitignore").write_text("*\n")
+
+    listed = []
+    real_scandir = os.scandir
+
+    def scandir(path):
+        listed.append(path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir)
+    paths = _paths(get_repo_structure("unused", str(repo)))
+
+    assert paths == {"main.py"}
+    assert not any("node_modules" in path for path in listed)
+
+def test_start_subpath_accepts_root_and_unnormalized_clone_path(tmp_path, monkeypatch):
+    _make_repo(tmp_path / "repo", ["src/a.py", "main.py"])
+    (tmp_path / "w").mkdir()
+    monkeypatch.chdir(tmp_path)
+
+    full = get_repo_structure("unused", "w/../repo")
+
+    assert get_repo_structure("unused", "w/../repo", start_subpath=".") == full
+    assert _paths(get_repo_structure("unused", "w/../repo", start_subpath="src")) == {"a.py"}
+
+def test_start_subpath_rejects_excluded_ignored_and_escaping_paths(tmp_path):
+    repo = _make_repo(
+        tmp_path / "repo",
+        ["node_modules/pkg/x.js", "build/out/y.txt", "src/a.py"],
+        gitignore="build/\n",
+    )
+    (tmp_path / "outside").mkdir()
+    os.symlink(tmp_path / "outside", repo / "link")
+
+    for subpath in ("node_modules/pkg", "build/out", "link", "../outside"):
+        with pytest.raises(ValueError):
+            get_repo_structure("unused", str(repo), start_subpath=subpath)
+
+@pytest.mark.parametrize("max_depth", [0, 1, None])
+def test_stream_matches_json_dumps_of_structure(tmp_path, max_depth):
+    repo = _make_repo(
+        tmp_path / "repo",
+        ["src/pkg/a.py", "src/b.py", "docs/caf\u00e9 \u6587\u6863.md", "README.md"],
+    )
+    (repo / "empty").mkdir()
+
+    out = io.StringIO()
+    stream_repo_structure("unused", out, str(repo), max_depth=max_depth)
+
+    expected = get_repo_structure("unused", str(repo), max_depth=max_depth)
+    assert out.getvalue() == json.dumps(expected)
+
+def test_repo_table_matches_structure_and_rows(tmp_path):
+    repo = _make_repo(
+        tmp_path / "repo",
+        ["src/pkg/a.py", "src/b.py", "Docs/x.md", "README.md"],
+    )
+    (repo / "empty").mkdir()
+
+    table = get_repo_table("unused", str(repo))
+
+    assert table.to_dict() == get_repo_structure("unused", str(repo))
+    assert list(table.rows()) == [
+        ("Docs", "directory"),
+        ("Docs/x.md", "file"),
+        ("empty", "directory"),
+        ("src", "directory"),
+        ("src/pkg", "directory"),
+        ("src/pkg/a.py", "file"),
+        ("src/b.py", "file"),
+        ("README.md", "file"),
+    ]
+
+@pytest.mark.parametrize("dir_count", [2, PARALLEL_DIR_THRESHOLD + 2])
+def test_compact_round_trips_to_dict(tmp_path, dir_count):
+    files = ["top.txt"]
+    for i in range(dir_count):
+        files += [f"d{i}/sub/leaf.py", f"d{i}/file{i}.txt"]
+    repo = _make_repo(tmp_path / "repo", files)
+    (repo / "d0" / "empty").mkdir()
+
+    compact = get_repo_structure("unused", str(repo), compact=True)
+
+    assert compact_to_dict(compact) == get_repo_structure("unused", str(repo))
+
+def _make_source_repo(path):
+    """
+    Creates a git repository with one commit at `path` to clone from.
+    """
+    path.mkdir()
+    (path / "main.py").write_text("print('hi')\n")
+    env = dict(
+        os.environ,
+        GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@example.com",
+        GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@example.com",
+    )
+    for args in (["init", "-q"], ["add", "main.py"], ["commit", "-q", "-m", "init"]):
+        subprocess.run(["git", "-C", str(path)] + args, env=env, check=True)
+    return path
+
+def test_clone_from_local_repo(tmp_path):
+    source = _make_source_repo(tmp_path / "source")
+
+    repo = clone_repo_with_progress(source.as_uri(), tmp_path / "clone")
+
+    assert isinstance(repo, git.Repo)
+    assert (tmp_path / "clone" / "main.py").is_file()
+
+def test_failed_clone_raises_without_leaking_token(tmp_path, monkeypatch):
+    # Tiny reads make lines span chunk boundaries
+    monkeypatch.setattr(repo_structure, "CLONE_READ_SIZE", 1)
+    url = "https://127.0.0.1:1/missing/repo.git"
+
+    with pytest.raises(git.GitCommandError) as excinfo:
+        clone_repo_with_progress(url, tmp_path / "clone", token="secret-token")
+
+    error = excinfo.value
+    assert error.status != 0
+    assert "fatal:" in error.stderr
+    assert url in error.command
+    assert "secret-token" not in " ".join(error.command)
+    assert "secret-token" not in str(error)